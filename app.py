@@ -1,79 +1,208 @@
 # app.py
+#
+# Query loading convention: read paths either select plain columns (see api_items) or load
+# ORM entities with options(raiseload("*")) / READ_ONLY_LOAD, so an accidental lazy load
+# raises instead of quietly issuing one query per row. If a relationship is genuinely
+# needed, load it explicitly with selectinload(...).
 import os
-from datetime import datetime, date, time as dtime
+from datetime import datetime, date, timedelta, time as dtime
 import threading
+import time
 import logging
-import uuid
+import hmac
+import hashlib
+import secrets
+import sqlite3
 
+import msgpack
+import orjson
 import pytz
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+import jinja2
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, abort, g, Response
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import URLSafeTimedSerializer
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import UniqueConstraint
-from sqlalchemy import func
+from sqlalchemy import UniqueConstraint, Index, Table, MetaData, Column
+from sqlalchemy import and_, select, update, delete, event, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import raiseload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 db = SQLAlchemy()
 
+# loader options for read-only entity lookups: any lazy load raises rather than hitting the DB
+READ_ONLY_LOAD = (raiseload("*"),)
+
+_EMPTY = {}  # shared fallback for missing/invalid JSON bodies; never mutate
+
 # -----------------------
 # Models (declared before create_app so migrations can import)
 # -----------------------
 class Item(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
+    # lowercased copy of name, set on insert; its unique index enforces case-insensitive uniqueness
+    name_ci = db.Column(db.String(120), unique=True, nullable=False, index=True)
     votes = db.Column(db.Integer, default=0, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Vote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey("item.id", ondelete="CASCADE"), nullable=False)
-    voter_token = db.Column(db.String(64), nullable=False, index=True)
+    voter_token = db.Column(db.String(64), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    __table_args__ = (UniqueConstraint("item_id", "voter_token", name="uix_item_voter"),)
+    __table_args__ = (
+        UniqueConstraint("item_id", "voter_token", name="uix_item_voter"),
+        # lets the voted_by_me outer join in /api/items resolve from the index alone;
+        # also serves voter_token-only lookups, so that column has no index of its own
+        Index("ix_vote_voter_item", "voter_token", "item_id"),
+    )
+
+
+def init_db():
+    """
+    Create missing tables and bring older ones up to the current schema.
+    create_all() never alters an existing table, so columns added later are migrated here.
+    """
+    db.create_all()
+    columns = {c["name"] for c in inspect(db.engine).get_columns("item")}
+    if "name_ci" not in columns:
+        # item tables created before name_ci existed: add, backfill, then index it
+        with db.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE item ADD COLUMN name_ci VARCHAR(120)"))
+            # backfill with str.lower() like new rows get; SQL lower() only folds ASCII on SQLite
+            rows = conn.execute(text("SELECT id, name FROM item")).all()
+            if rows:
+                conn.execute(
+                    text("UPDATE item SET name_ci = :name_ci WHERE id = :id"),
+                    [{"id": r.id, "name_ci": r.name.lower()} for r in rows],
+                )
+            if conn.dialect.name != "sqlite":  # SQLite can't add NOT NULL to an existing column
+                conn.execute(text("ALTER TABLE item ALTER COLUMN name_ci SET NOT NULL"))
+            conn.execute(text("CREATE UNIQUE INDEX ix_item_name_ci ON item (name_ci)"))
+
+    # vote tables from before ix_vote_voter_item: add it, drop the voter_token index it supersedes
+    with db.engine.begin() as conn:
+        for index in Vote.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        if "ix_vote_voter_token" in {i["name"] for i in inspect(conn).get_indexes("vote")}:
+            # built on a detached Table so the old index isn't re-attached to Vote's metadata
+            legacy_vote = Table("vote", MetaData(), Column("voter_token", db.String(64)))
+            Index("ix_vote_voter_token", legacy_vote.c.voter_token).drop(conn)
+
+
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _record):
+    # only applies to the default sqlite:/// URI; other backends are left alone
+    if isinstance(dbapi_conn, sqlite3.Connection):
+        cur = dbapi_conn.cursor()
+        # WAL lets /api/items reads proceed while a vote commit is writing;
+        # NORMAL sync is durable across app crashes in WAL mode, only not power loss
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        # SQLite ignores FOREIGN KEY clauses (incl. ON DELETE CASCADE) unless asked per connection
+        cur.execute("PRAGMA foreign_keys=ON")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.close()
 
 
 # -----------------------
 # Reset-once-per-day logic (no APScheduler)
 # -----------------------
 _reset_lock = threading.Lock()
-_last_reset_date = None  # stores date object of last reset (in RESET_TZ)
+_last_reset_ordinal = 0  # date.toordinal() of last reset (in RESET_TZ), 0 = never
+_next_reset_check = 0.0  # epoch seconds of the next RESET_TIME; maybe_reset is a no-op before it
+_TZ_CACHE = {}
+
+def get_reset_tz(name):
+    """Return the (memoized) pytz timezone for name, falling back to UTC."""
+    tz = _TZ_CACHE.get(name)
+    if tz is None:
+        try:
+            tz = pytz.timezone(name)
+        except Exception:
+            tz = pytz.UTC
+        _TZ_CACHE[name] = tz
+    return tz
+
+def _next_reset_ts(now, tz, RESET_TIME):
+    """Epoch seconds of the first RESET_TIME strictly after now (localized, so DST-aware)."""
+    day = now.date()
+    if now.time() >= RESET_TIME:
+        day += timedelta(days=1)
+    return tz.localize(datetime.combine(day, RESET_TIME)).timestamp()
 
 def maybe_reset(app, RESET_TZ, RESET_TIME):
     """
     Deletes all Item records once per day after RESET_TIME in RESET_TZ timezone.
     Safe to call on every request - will perform deletion at most once per day (per process).
+    Until the next RESET_TIME comes round a call is just time.time() and a float compare.
     For multi-instance deployments prefer cron / scheduler or a DB-based marker.
     """
-    global _last_reset_date
-    try:
-        tz = pytz.timezone(RESET_TZ)
-    except Exception:
-        tz = pytz.UTC
-
-    now = datetime.now(tz)
-    today = now.date()
-
-    if _last_reset_date == today:
+    global _last_reset_ordinal, _next_reset_check
+    now_ts = time.time()
+    if now_ts < _next_reset_check:
         return
 
-    if now.time() < RESET_TIME:
+    tz = get_reset_tz(RESET_TZ)
+    now = datetime.fromtimestamp(now_ts, tz)
+    today = now.date().toordinal()
+
+    if _last_reset_ordinal == today or now.time() < RESET_TIME:
+        _next_reset_check = _next_reset_ts(now, tz, RESET_TIME)
         return
 
     with _reset_lock:
-        if _last_reset_date == today:
+        if _last_reset_ordinal == today:
             return
         with app.app_context():
-            # delete Votes and Items
-            Vote.query.delete()
-            Item.query.delete()
+            # delete Items; their Votes go with them via ON DELETE CASCADE
+            db.session.execute(delete(Item))
             db.session.commit()
-            _last_reset_date = today
-            app.logger.info(f"Daily reset executed at {now.isoformat()} ({RESET_TZ})")
+            _last_reset_ordinal = today
+            _next_reset_check = _next_reset_ts(now, tz, RESET_TIME)
+            if app.logger.isEnabledFor(logging.INFO):
+                app.logger.info("Daily reset executed at %s (%s)", now.isoformat(), RESET_TZ)
 
 
 # -----------------------
 # Helpers / decorators
 # -----------------------
+def blake2b_160(data=b""):
+    """BLAKE2b truncated to SHA1's 20 bytes, so the signature adds no cookie length."""
+    return hashlib.blake2b(data, digest_size=20)
+
+class TextURLSafeTimedSerializer(URLSafeTimedSerializer):
+    """URLSafeTimedSerializer that returns str; binary serializers otherwise yield bytes,
+    which Werkzeug's set_cookie rejects. The payload is already URL-safe base64."""
+    def dumps(self, obj, salt=None):
+        return super().dumps(obj, salt).decode("ascii")
+
+class MsgpackSessionInterface(SecureCookieSessionInterface):
+    """
+    Signed cookie sessions encoded with msgpack and signed with HMAC-BLAKE2b instead of
+    tagged JSON + HMAC-SHA1. Every request here reads the session (voter_token, logged_in),
+    so this is on the hot path. Session values must be msgpack-native types.
+    """
+    serializer = msgpack
+    digest_method = staticmethod(blake2b_160)
+
+    def get_signing_serializer(self, app):
+        if not app.secret_key:
+            return None
+        # oldest first, current key last (same order Flask uses for SECRET_KEY_FALLBACKS)
+        keys = list(app.config.get("SECRET_KEY_FALLBACKS") or ())
+        keys.append(app.secret_key)
+        return TextURLSafeTimedSerializer(
+            keys,
+            salt=self.salt,
+            serializer=self.serializer,
+            signer_kwargs={"key_derivation": self.key_derivation, "digest_method": self.digest_method},
+        )
+
 def require_login(fn):
     from functools import wraps
     @wraps(fn)
@@ -83,11 +212,76 @@ def require_login(fn):
         return fn(*args, **kwargs)
     return wrapper
 
+def make_password_verifier(pwhash):
+    """
+    Return a verify(pw) -> bool for a Werkzeug password hash.
+    scrypt hashes are parsed once here and checked with hashlib.scrypt directly (same
+    derivation as werkzeug.security); any other method falls back to check_password_hash.
+    """
+    method, salt, expected = pwhash.split("$", 2)
+    if not method.startswith("scrypt:"):
+        return lambda pw: check_password_hash(pwhash, pw)
+
+    n, r, p = (int(x) for x in method.split(":")[1:])
+    salt = salt.encode()
+    expected = bytes.fromhex(expected)
+    maxmem = 132 * n * r * p  # as werkzeug: OpenSSL's default limit is too small for n=32768
+
+    def verify(pw):
+        derived = hashlib.scrypt(
+            pw.encode(), salt=salt, n=n, r=r, p=p, maxmem=maxmem, dklen=len(expected)
+        )
+        return hmac.compare_digest(derived, expected)
+
+    return verify
+
+_DIALECT_INSERTS = {"sqlite": sqlite_insert, "postgresql": pg_insert}
+
+def add_vote(item_id, voter):
+    """
+    Insert a Vote; returns False if this voter already voted for the item.
+    SQLite/PostgreSQL use INSERT ... ON CONFLICT DO NOTHING; other backends fall back to an ORM
+    flush against uix_item_voter. An unknown item_id raises IntegrityError (FK) where enforced.
+    """
+    insert = _DIALECT_INSERTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        stmt = (
+            insert(Vote)
+            .values(item_id=item_id, voter_token=voter)
+            .on_conflict_do_nothing(index_elements=["item_id", "voter_token"])
+        )
+        return db.session.execute(stmt).rowcount > 0
+
+    db.session.add(Vote(item_id=item_id, voter_token=voter))
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        if db.session.get(Item, item_id, options=READ_ONLY_LOAD) is None:
+            raise
+        return False
+    return True
+
+def increment_votes(item_id):
+    """Add one to Item.votes in SQL and return the new count, or None if there is no such item."""
+    stmt = (
+        update(Item)
+        .where(Item.id == item_id)
+        .values(votes=Item.votes + 1)
+        # no Item objects are loaded in this session, so skip identity-map synchronization
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.get_bind().dialect.update_returning:
+        return db.session.execute(stmt.returning(Item.votes)).scalar_one_or_none()
+    if not db.session.execute(stmt).rowcount:
+        return None
+    return db.session.execute(select(Item.votes).where(Item.id == item_id)).scalar_one()
+
 def ensure_voter_token():
     """Ensure a persistent voter_token exists in session and return it."""
     token = session.get("voter_token")
     if not token:
-        token = uuid.uuid4().hex
+        token = secrets.token_hex(16)
         session["voter_token"] = token
     return token
 
@@ -101,16 +295,51 @@ def create_app(test_config=None):
     Reads configuration from environment variables (sane defaults for local dev).
     """
     app = Flask(__name__, static_folder="static", template_folder="templates")
+    app.session_interface = MsgpackSessionInterface()
+
+    # templates don't change in production: share compiled template bytecode across
+    # workers and restarts (auto_reload already follows app.debug)
+    if not app.debug:
+        app.jinja_env.bytecode_cache = jinja2.FileSystemBytecodeCache()
 
     # Config from environment
     app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "change_this_secret_in_prod")
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///items.db")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        # each Gunicorn worker is its own process with its own pool and never holds more
+        # connections than it has threads (--threads 4), so size the pool to match; the
+        # total across workers is roughly workers x (pool_size + max_overflow)
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            "pool_size": int(os.environ.get("DB_POOL_SIZE", "4")),
+            "max_overflow": 2,
+            "pool_pre_ping": True,
+            "pool_recycle": 1800,
+        }
 
     ADMIN_PASS_HASH = "scrypt:32768:8:1$INnuLziqpYVfTZ2d$5ae101b115844cca1f313cacd2323f10a81cc14127ad55b66a1e4097e8da5dc3ad342e37791713013f8e9333d241a2b5637f208c33624d8679cb3c27970d557a"
 
+    check_admin_hash = make_password_verifier(ADMIN_PASS_HASH)
+
+    # keyed digests of passwords that already passed scrypt, so repeat logins skip it
+    _admin_pw_cache = set()
+    _ADMIN_PW_CACHE_MAX = 4
+
+    def verify_admin_password(pw):
+        probe = hmac.new(app.secret_key.encode(), pw.encode(), "sha256").digest()
+        for known in tuple(_admin_pw_cache):  # snapshot: other threads may add concurrently
+            if hmac.compare_digest(probe, known):
+                return True
+        if not check_admin_hash(pw):
+            return False
+        if len(_admin_pw_cache) < _ADMIN_PW_CACHE_MAX:
+            _admin_pw_cache.add(probe)
+        return True
+
     RESET_TZ = os.environ.get("RESET_TZ", "Asia/Kolkata")
     RESET_TIME = dtime.fromisoformat(os.environ.get("RESET_TIME", "18:00:00"))
+    MAX_ITEMS = int(os.environ.get("MAX_ITEMS", "200"))  # leaderboard size returned by /api/items
+    get_reset_tz(RESET_TZ)  # resolve once up front so requests never construct it
 
     # initialize extensions
     db.init_app(app)
@@ -126,24 +355,32 @@ def create_app(test_config=None):
         app.logger.addHandler(stream_handler)
     app.logger.setLevel(logging.INFO)
 
-    # create DB tables if missing (for simple deployments)
-    with app.app_context():
-        db.create_all()
-        app.logger.info(f"DB initialized at {app.config['SQLALCHEMY_DATABASE_URI']}")
+    # create/migrate DB tables. Only done when RUN_DB_CREATE=1 so each Gunicorn worker
+    # doesn't re-inspect the schema on boot; run it once before starting the workers
+    # (importing the module builds the app below, which is enough):
+    #   RUN_DB_CREATE=1 python -c "import app"
+    # A plain `gunicorn app:app` against a fresh database skips this and fails with
+    # "no such table" until the step has been run.
+    if os.environ.get("RUN_DB_CREATE") == "1":
+        with app.app_context():
+            init_db()
+            if app.logger.isEnabledFor(logging.INFO):
+                app.logger.info("DB initialized at %s", app.config["SQLALCHEMY_DATABASE_URI"])
 
     # -----------------------
-    # Routes (closures so they capture ADMIN_PASS_HASH, RESET_TZ, RESET_TIME)
+    # Routes (closures so they capture ADMIN_PASS_HASH, RESET_TZ, RESET_TIME, MAX_ITEMS)
     # -----------------------
     @app.before_request
     def _before_request():
-        # ensure each session gets a persistent voter token used to limit votes
-        ensure_voter_token()
+        # ensure each session gets a persistent voter token used to limit votes;
+        # handlers read it from g rather than going back to the session
+        g.voter_token = ensure_voter_token()
 
     @app.route("/login", methods=["GET", "POST"])
     def login():
         if request.method == "POST":
             pw = request.form.get("password", "")
-            if check_password_hash(ADMIN_PASS_HASH, pw):
+            if verify_admin_password(pw):
                 session["logged_in"] = True
                 session.permanent = True
                 return redirect(url_for("index"))
@@ -166,14 +403,24 @@ def create_app(test_config=None):
     @require_login
     def api_items():
         maybe_reset(app, RESET_TZ, RESET_TIME)
-        items = Item.query.order_by(Item.votes.desc(), Item.created_at.asc()).all()
         # include whether current voter has voted on each item (helpful for UI to disable bubble)
-        voter = session.get("voter_token")
-        voted_item_ids = set()
-        if voter:
-            votes = Vote.query.filter_by(voter_token=voter).all()
-            voted_item_ids = {v.item_id for v in votes}
-        return jsonify([{"id": it.id, "name": it.name, "votes": it.votes, "voted_by_me": (it.id in voted_item_ids)} for it in items])
+        # single round-trip: outer join against this voter's votes instead of a second query,
+        # selecting plain columns so no ORM objects are built (created_at is only sorted on)
+        voter = g.voter_token
+        rows = db.session.execute(
+            select(
+                Item.id,
+                Item.name,
+                Item.votes,
+                Vote.id.isnot(None).label("voted_by_me"),
+            )
+            .outerjoin(Vote, and_(Vote.item_id == Item.id, Vote.voter_token == voter))
+            .order_by(Item.votes.desc(), Item.created_at.asc())
+            .limit(MAX_ITEMS)
+        ).all()
+        # polled by every open client: orjson encodes straight to UTF-8 bytes
+        data = [{"id": r.id, "name": r.name, "votes": r.votes, "voted_by_me": r.voted_by_me} for r in rows]
+        return Response(orjson.dumps(data), mimetype="application/json")
 
 
 
@@ -181,21 +428,20 @@ def create_app(test_config=None):
     @require_login
     def api_add_item():
         maybe_reset(app, RESET_TZ, RESET_TIME)
-        data = request.get_json() or {}
+        data = request.get_json(silent=True, cache=True) or _EMPTY
         name = (data.get("name") or "").strip()
 
         if not name:
             return jsonify({"error": "Name required"}), 400
 
-        # --- NEW: case-insensitive duplicate check ---
-        existing = Item.query.filter(func.lower(Item.name) == name.lower()).first()
-        if existing:
-            return jsonify({"error": "This item is already in the list."}), 400
-        # ------------------------------------------------
-
-        it = Item(name=name, votes=0)
+        # case-insensitive duplicates are rejected by the unique index on name_ci
+        it = Item(name=name, name_ci=name.lower(), votes=0)
         db.session.add(it)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"error": "This item is already in the list."}), 400
 
         return jsonify({"ok": True, "id": it.id, "name": it.name, "votes": it.votes})
 
@@ -204,30 +450,31 @@ def create_app(test_config=None):
     @require_login
     def api_vote(item_id):
         maybe_reset(app, RESET_TZ, RESET_TIME)
-        voter = session.get("voter_token")
-        if not voter:
-            # should never happen because of before_request, but just in case
-            voter = ensure_voter_token()
-
-        # Ensure item exists
-        it = Item.query.get_or_404(item_id)
+        voter = g.voter_token
 
-        # Try to insert a Vote row. UniqueConstraint will prevent double-voting for same voter_token+item.
-        v = Vote(item_id=item_id, voter_token=voter)
-        db.session.add(v)
+        # Insert the Vote and bump the counter in one transaction. A repeat vote for the same
+        # voter_token+item hits uix_item_voter and add_vote reports it without raising; the
+        # increment is done in SQL so concurrent voters can't overwrite each other's count.
         try:
-            # commit the Vote; if it violates unique constraint, IntegrityError will be raised
-            db.session.commit()
+            inserted = add_vote(item_id, voter)
         except IntegrityError:
+            # FK violation: unknown item
+            db.session.rollback()
+            if db.session.get(Item, item_id, options=READ_ONLY_LOAD) is None:
+                abort(404)
+            raise
+        if not inserted:
             db.session.rollback()
             return jsonify({"ok": False, "error": "You have already voted for this item."}), 400
 
-        # Only increment Item.votes when Vote insertion succeeded
-        it.votes = Item.votes + 1 if isinstance(Item.votes, int) else it.votes + 1  # safe increment
-        # better: increment the specific instance's votes
-        db.session.add(it)
+        votes = increment_votes(item_id)
+        if votes is None:
+            # no such item
+            db.session.rollback()
+            abort(404)
+
         db.session.commit()
-        return jsonify({"ok": True, "id": it.id, "votes": it.votes})
+        return jsonify({"ok": True, "id": item_id, "votes": votes})
 
     @app.route("/health")
     def health():
@@ -247,5 +494,7 @@ app = create_app()
 # If running locally via `python app.py`, start Flask dev server (useful for quick dev)
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
+    with app.app_context():
+        init_db()  # single dev process, so no need for RUN_DB_CREATE
     app.logger.info(f"Starting dev server (DB={app.config['SQLALCHEMY_DATABASE_URI']}) Reset at {app.config['RESET_TIME']} in TZ={app.config['RESET_TZ']}")
     app.run(host="0.0.0.0", port=port)
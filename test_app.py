@@ -0,0 +1,191 @@
+import os
+import sqlite3
+import tempfile
+from datetime import time as dtime
+
+# app.py builds its app at import time, so point it at a throwaway DB first
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'items.db')}"
+os.environ["RUN_DB_CREATE"] = "1"
+
+from flask.sessions import SecureCookieSessionInterface  # noqa: E402
+
+import app as app_module  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from app import READ_ONLY_LOAD, Item, Vote, app, db  # noqa: E402
+
+
+def _login():
+    client = app.test_client()
+    client.post("/login", data={"password": "floor3"})
+    return client
+
+
+# schema as created by the original models, before name_ci and ix_vote_voter_item
+BASELINE_SCHEMA = """
+CREATE TABLE item (
+    id INTEGER NOT NULL,
+    name VARCHAR(120) NOT NULL,
+    votes INTEGER NOT NULL,
+    created_at DATETIME,
+    PRIMARY KEY (id)
+);
+CREATE TABLE vote (
+    id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    voter_token VARCHAR(64) NOT NULL,
+    created_at DATETIME,
+    PRIMARY KEY (id),
+    CONSTRAINT uix_item_voter UNIQUE (item_id, voter_token),
+    FOREIGN KEY(item_id) REFERENCES item (id) ON DELETE CASCADE
+);
+CREATE INDEX ix_vote_voter_token ON vote (voter_token);
+"""
+
+
+def _baseline_app(monkeypatch, *names):
+    """App whose DB was created by the original schema (holding names), then migrated."""
+    path = os.path.join(tempfile.mkdtemp(), "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO item (name, votes) VALUES (?, 0)", [(n,) for n in names])
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{path}")
+    return app_module.create_app(), path
+
+
+def _add_item(client, name):
+    res = client.post("/api/items", json={"name": name})
+    assert res.status_code == 200
+    return res.get_json()["id"]
+
+
+def test_health_sets_session_cookie():
+    client = app.test_client()
+    res = client.get("/health")
+    assert res.status_code == 200
+    assert client.get_cookie("session") is not None
+
+
+def test_login_and_session_round_trip():
+    client = app.test_client()
+    assert client.get("/login").status_code == 200
+
+    res = client.post("/login", data={"password": "floor3"})
+    assert res.status_code == 302
+    assert res.headers["Location"].endswith("/")
+
+    # the msgpack session cookie must load back with logged_in set
+    assert client.get("/").status_code == 200
+    assert client.get("/api/items").status_code == 200
+
+
+def test_login_rejects_wrong_password():
+    client = app.test_client()
+    res = client.post("/login", data={"password": "nope"})
+    assert res.status_code == 200
+    assert b"Incorrect password" in res.data
+
+
+def _logged_in_cookie():
+    client = app.test_client()
+    client.post("/login", data={"password": "floor3"})
+    return client.get_cookie("session").value
+
+
+def test_session_cookie_not_larger_than_flask_default():
+    ours = _logged_in_cookie()
+    custom = app.session_interface
+    app.session_interface = SecureCookieSessionInterface()
+    try:
+        default = _logged_in_cookie()
+    finally:
+        app.session_interface = custom
+    assert len(ours) <= len(default)
+
+
+def test_vote_without_upsert_or_returning_support(monkeypatch):
+    # backends outside _DIALECT_INSERTS go through the ORM flush + plain UPDATE path
+    monkeypatch.delitem(app_module._DIALECT_INSERTS, "sqlite")
+    with app.app_context():
+        monkeypatch.setattr(db.engine.dialect, "update_returning", False)
+    client = _login()
+    item_id = _add_item(client, "Fallback Pav Bhaji")
+
+    res = client.post(f"/api/items/{item_id}/vote")
+    assert res.status_code == 200
+    assert res.get_json()["votes"] == 1
+    assert client.post(f"/api/items/{item_id}/vote").status_code == 400
+    assert client.post("/api/items/999999/vote").status_code == 404
+
+
+def test_init_db_migrates_baseline_item_table(monkeypatch):
+    old_app, path = _baseline_app(monkeypatch, "Éclair", "Samosa")
+
+    conn = sqlite3.connect(path)
+    assert dict(conn.execute("SELECT name, name_ci FROM item")) == {"Éclair": "éclair", "Samosa": "samosa"}
+    vote_indexes = {r[0] for r in conn.execute("SELECT name FROM pragma_index_list('vote') WHERE origin = 'c'")}
+    assert vote_indexes == {"ix_vote_voter_item"}
+    conn.close()
+
+    client = old_app.test_client()
+    client.post("/login", data={"password": "floor3"})
+    # backfill folds non-ASCII the same way new rows do
+    assert client.post("/api/items", json={"name": "éclair"}).status_code == 400
+    assert client.post("/api/items", json={"name": "Vada"}).status_code == 200
+
+
+def test_votes_increment_per_voter():
+    item_id = _add_item(_login(), "Masala Dosa")
+
+    first = _login().post(f"/api/items/{item_id}/vote")
+    second = _login().post(f"/api/items/{item_id}/vote")
+    assert first.status_code == 200 and first.get_json()["votes"] == 1
+    assert second.status_code == 200 and second.get_json()["votes"] == 2
+
+
+def test_second_vote_rejected_and_count_unchanged():
+    client = _login()
+    item_id = _add_item(client, "Chole Bhature")
+    assert client.post(f"/api/items/{item_id}/vote").status_code == 200
+
+    res = client.post(f"/api/items/{item_id}/vote")
+    assert res.status_code == 400
+    items = {it["id"]: it for it in client.get("/api/items").get_json()}
+    assert items[item_id]["votes"] == 1
+    assert items[item_id]["voted_by_me"] is True
+
+
+def test_vote_unknown_item_returns_404():
+    assert _login().post("/api/items/999999/vote").status_code == 404
+
+
+def test_duplicate_name_is_case_insensitive():
+    client = _login()
+    _add_item(client, "Rava Idli")
+    res = client.post("/api/items", json={"name": "rAVA iDLI"})
+    assert res.status_code == 400
+
+
+def test_read_only_load_guard_does_not_raise():
+    item_id = _add_item(_login(), "Upma")
+    with app.app_context():
+        it = db.session.get(Item, item_id, options=READ_ONLY_LOAD)
+        assert (it.name, it.votes) == ("Upma", 0)
+
+
+def test_maybe_reset_cascades_votes(monkeypatch):
+    client = _login()
+    item_id = _add_item(client, "Poha")
+    client.post(f"/api/items/{item_id}/vote")
+
+    # force the next check to see a new day past a midnight reset time
+    monkeypatch.setattr(app_module, "_last_reset_ordinal", 0)
+    monkeypatch.setattr(app_module, "_next_reset_check", 0.0)
+    app_module.maybe_reset(app, "UTC", dtime(0, 0))
+
+    with app.app_context():
+        assert db.session.execute(select(func.count()).select_from(Item)).scalar() == 0
+        assert db.session.execute(select(func.count()).select_from(Vote)).scalar() == 0